@@ -1,41 +1,27 @@
 import os
-import email
-from email.message import Message
-import yaml
 from flask import Flask, request, jsonify, render_template
 from flask_cors import CORS
+try:
+    import orjson
+except ImportError:
+    orjson = None
 
 # Import all your existing analysis functions
 from src.utils.logging import logger
-from src.ingest import parse_email_from_string, get_email_body
+from src.config import load_config, load_compiled_config
+from src.ingest import parse_email_from_bytes, walk_once, get_email_body_from_parts
 from src.headers import analyze_headers
 from src.urls import extract_urls, analyze_all_urls
-from src.attachments import analyze_attachments
-from src.scoring import calculate_risk_score
+from src.attachments import analyze_attachments_from_parts
+from src.scoring import calculate_risk_score, determine_risk_level
 from src.report import generate_report # Re-added for consistency, though not used in web response
 
 app = Flask(__name__)
 CORS(app) # Allows the HTML file to communicate with this server
 
-def load_config():
-    """Loads the main configuration file."""
-    config_path = os.path.join(os.path.dirname(__file__), 'config', 'config.yaml')
-    try:
-        with open(config_path, 'r') as f:
-            config = yaml.safe_load(f)
-            logger.info("Configuration file loaded successfully for the server.")
-            # Diagnostic print to be sure:
-            # import json
-            # print(json.dumps(config, indent=2))
-            return config
-    except FileNotFoundError:
-        logger.error(f"FATAL: Configuration file not found at: {config_path}")
-        return {}
-    except yaml.YAMLError as e:
-        logger.error(f"FATAL: Error parsing YAML file: {e}")
-        return {}
-
-config = load_config()
+CONFIG_PATH = os.path.join(os.path.dirname(__file__), 'config', 'config.yaml')
+config = load_config(CONFIG_PATH)
+compiled_config = load_compiled_config(CONFIG_PATH)
 
 @app.route('/analyze', methods=['POST'])
 def analyze():
@@ -52,37 +38,32 @@ def analyze():
     logger.info("Received request for email analysis.")
 
     # --- Analysis Pipeline ---
-    msg = parse_email_from_string(raw_email)
+    # Encode once: the same bytes are parsed and handed to DKIM verification.
+    raw_bytes = raw_email.encode('utf-8')
+    msg = parse_email_from_bytes(raw_bytes)
     if not msg:
         return jsonify({'error': 'Failed to parse email source'}), 500
     
-    email_body = get_email_body(msg)
+    mime_parts = walk_once(msg)
+    email_body = get_email_body_from_parts(mime_parts)
     
     # --- CRITICAL FIX: Ensure the full, correct config is passed ---
-    header_results = analyze_headers(msg, raw_email.encode('utf-8'))
+    header_results = analyze_headers(msg, raw_bytes)
     urls = extract_urls(email_body)
     url_results = analyze_all_urls(urls, config)
-    attachment_results = analyze_attachments(msg, config)
+    attachment_results = analyze_attachments_from_parts(mime_parts['attachments'], compiled_config)
     
     # Scoring
-    score_weights = config.get('scoring', {}).get('weights', {})
     score_results = calculate_risk_score(
         header_results, 
         url_results, 
         attachment_results, 
-        score_weights
+        compiled_config.score_weights
     )
 
     # Determine risk level from thresholds
-    thresholds = config.get('thresholds', {})
     score = score_results.get('total_score', 0)
-    risk_level = "Very Low"
-    if score >= thresholds.get('high', 80):
-        risk_level = "High"
-    elif score >= thresholds.get('medium', 60):
-        risk_level = "Medium"
-    elif score >= thresholds.get('low', 30):
-        risk_level = "Low"
+    risk_level = determine_risk_level(score, compiled_config.thresholds)
 
     # --- Final Report ---
     report = {
@@ -99,6 +80,8 @@ def analyze():
     }
     
     logger.info(f"Analysis complete. Sending report with score: {score}")
+    if orjson is not None:
+        return app.response_class(orjson.dumps(report), mimetype='application/json')
     return jsonify(report)
 
 if __name__ == '__main__':
@@ -1,59 +1,46 @@
 import os
+import glob
 import argparse
-import yaml
-from typing import Dict, Any
+from multiprocessing import Pool
+from typing import Dict, Any, Optional, Tuple
 
 # Import all the necessary functions from your project modules
-from src.ingest import parse_email_file, get_email_body
+from src.ingest import parse_email_file, read_email_bytes, walk_once, get_email_body_from_parts
 from src.headers import analyze_headers
 from src.urls import extract_urls, analyze_all_urls
-from src.attachments import analyze_attachments
-from src.scoring import calculate_risk_score
+from src.attachments import analyze_attachments_from_parts
+from src.scoring import calculate_risk_score, determine_risk_level
 from src.report import generate_report
 from src.utils.logging import logger
+from src.config import CompiledConfig, load_config, load_compiled_config
 
-def load_config(config_path: str = 'config/config.yaml') -> Dict[str, Any]:
-    """Loads the main configuration file."""
-    try:
-        with open(config_path, 'r') as f:
-            config = yaml.safe_load(f)
-        logger.info("Configuration file loaded successfully.")
-        return config
-    except FileNotFoundError:
-        logger.error(f"Configuration file not found at: {config_path}")
-        return {}
-    except yaml.YAMLError as e:
-        logger.error(f"Error parsing YAML configuration file: {e}")
-        return {}
+# Per-process config for batch workers, populated once by _worker_init.
+_worker_config: Dict[str, Any] = {}
+_worker_compiled: Optional[CompiledConfig] = None
 
-def main(email_path: str):
+def analyze_email(email_path: str, config: Dict[str, Any], compiled: CompiledConfig) -> Optional[Dict[str, Any]]:
     """
-    Main function to orchestrate the email analysis pipeline.
+    Runs the full analysis pipeline on one email and writes its report.
+    Returns the scoring results, or None if the email could not be read.
     """
     logger.info(f"Starting analysis for email: {email_path}")
 
-    # 1. Load Configuration
-    config = load_config()
-    if not config:
-        logger.error("Could not load configuration. Aborting analysis.")
-        return
-
-    # 2. Ingest and Parse Email
+    # 1. Ingest and Parse Email
     msg = parse_email_file(email_path)
     if not msg:
-        return # Error already logged by parse_email_file
+        return None # Error already logged by parse_email_file
 
     # Read raw email bytes for DKIM verification
     try:
-        with open(email_path, 'rb') as f:
-            raw_email_data = f.read()
+        raw_email_data = read_email_bytes(email_path)
     except Exception as e:
         logger.error(f"Could not read raw email file {email_path}: {e}")
-        return
+        return None
         
-    email_body = get_email_body(msg)
+    mime_parts = walk_once(msg)
+    email_body = get_email_body_from_parts(mime_parts)
 
-    # 3. Run Analysis Modules
+    # 2. Run Analysis Modules
     logger.info("--- Starting Header Analysis ---")
     header_results = analyze_headers(msg, raw_email_data)
 
@@ -63,23 +50,18 @@ def main(email_path: str):
     url_results = analyze_all_urls(urls, config)
 
     logger.info("--- Starting Attachment Analysis ---")
-    # Pass the config to the refactored function
-    attachment_results = analyze_attachments(msg, config)
+    attachment_results = analyze_attachments_from_parts(mime_parts['attachments'], compiled)
 
-    # 4. Calculate Risk Score
+    # 3. Calculate Risk Score
     logger.info("--- Calculating Risk Score ---")
-    
-    # --- CRITICAL FIX IS HERE ---
-    # We now pass the specific 'weights' dictionary from the config, not the whole 'scoring' block.
-    score_weights = config.get('scoring', {}).get('weights', {})
     score_results = calculate_risk_score(
         header_results,
         url_results,
         attachment_results,
-        score_weights # Pass the corrected dictionary
+        compiled.score_weights
     )
 
-    # 5. Generate Report
+    # 4. Generate Report
     logger.info("--- Generating Report ---")
     generate_report(
         email_path,
@@ -87,18 +69,67 @@ def main(email_path: str):
         url_results,
         attachment_results,
         score_results,
-        config.get('paths', {}).get('reports_output', 'outputs/reports/')
+        config.get('paths', {}).get('reports_output', 'outputs/reports/'),
+        risk_level=determine_risk_level(score_results['total_score'], compiled.thresholds)
     )
 
     logger.info(f"Analysis complete for {email_path}. Final score: {score_results.get('total_score')}")
+    return score_results
+
+def main(email_path: str):
+    """
+    Main function to orchestrate the email analysis pipeline.
+    """
+    config = load_config()
+    if not config:
+        logger.error("Could not load configuration. Aborting analysis.")
+        return
+
+    analyze_email(email_path, config, load_compiled_config())
+
+def _worker_init():
+    """Loads the configuration once per worker process."""
+    global _worker_config, _worker_compiled
+    _worker_config = load_config()
+    _worker_compiled = load_compiled_config()
+
+def _analyze_one(email_path: str) -> Tuple[str, Optional[int]]:
+    """Pool task: analyzes one email with the worker's config."""
+    try:
+        score_results = analyze_email(email_path, _worker_config, _worker_compiled)
+    except Exception as e:
+        logger.error(f"Unexpected error while analyzing {email_path}: {e}")
+        return email_path, None
+    return email_path, score_results.get('total_score') if score_results else None
+
+def main_batch(directory: str, processes: Optional[int] = None):
+    """
+    Analyzes every .eml file in a directory using a pool of worker processes.
+    """
+    email_paths = sorted(glob.glob(os.path.join(directory, '*.eml')))
+    if not email_paths:
+        logger.warning(f"No .eml files found in directory: {directory}")
+        return
+
+    if not load_config():
+        logger.error("Could not load configuration. Aborting analysis.")
+        return
+
+    logger.info(f"Starting batch analysis of {len(email_paths)} emails.")
+    with Pool(processes=processes or os.cpu_count(), initializer=_worker_init) as pool:
+        for email_path, score in pool.imap_unordered(_analyze_one, email_paths, chunksize=8):
+            logger.info(f"Batch result for {email_path}: score {score}")
 
 if __name__ == '__main__':
     parser = argparse.ArgumentParser(description="Analyze an email for phishing signs.")
-    parser.add_argument("email_file", help="The path to the .eml email file to analyze.")
+    parser.add_argument("email_file", help="The path to the .eml email file, or a directory of .eml files, to analyze.")
+    parser.add_argument("-j", "--processes", type=int, default=None, help="Worker processes for directory mode (default: CPU count).")
     
     args = parser.parse_args()
     
     if not os.path.exists(args.email_file):
         print(f"Error: The file '{args.email_file}' does not exist.")
+    elif os.path.isdir(args.email_file):
+        main_batch(args.email_file, args.processes)
     else:
         main(args.email_file)
\ No newline at end of file
@@ -1,65 +1,91 @@
 from email.message import Message
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Union
 import os
 import zipfile
 import io
 
 from src.utils.logging import logger
+from src.ingest import walk_once
+from src.config import CompiledConfig
 
-def analyze_attachments(msg: Message, config: Dict[str, Any]) -> List[Dict[str, Any]]:
+def analyze_attachments(msg: Message, compiled: Union[CompiledConfig, Dict[str, Any]]) -> List[Dict[str, Any]]:
     """
-    Analyzes email attachments based on a provided configuration dictionary.
+    Analyzes email attachments based on the compiled configuration.
 
     Args:
         msg (Message): The email message object to analyze.
-        config (Dict[str, Any]): A dictionary containing the analysis settings.
+        compiled (CompiledConfig): The compiled settings. A raw config dictionary is also accepted.
     
     Returns:
         List[Dict[str, Any]]: A list of analysis results for each attachment.
     """
+    # Single-part messages cannot carry attachments.
+    if not msg.is_multipart():
+        return []
+    return analyze_attachments_from_parts(walk_once(msg)['attachments'], compiled)
 
-    attachment_config = config.get('attachment_analysis', {})
-    dangerous_extensions = set(attachment_config.get('dangerous_extensions', []))
+def analyze_attachments_from_parts(parts: List[Message], compiled: Union[CompiledConfig, Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    Analyzes attachment parts already collected by walk_once, so callers that
+    also need the body do not traverse the MIME tree twice.
+
+    Args:
+        parts (List[Message]): Parts marked with 'Content-Disposition: attachment'.
+        compiled (CompiledConfig): The compiled settings. A raw config dictionary is also accepted.
+
+    Returns:
+        List[Dict[str, Any]]: A list of analysis results for each attachment.
+    """
+    if not isinstance(compiled, CompiledConfig):
+        compiled = CompiledConfig.from_dict(compiled)
+
+    dangerous_ext_fset = compiled.dangerous_ext_fset
+    dangerous_ext_tuple = compiled.dangerous_ext_tuple
+    max_zip_inspect_bytes = compiled.max_zip_inspect_bytes
 
-    if not dangerous_extensions:
+    if not dangerous_ext_fset:
         logger.warning("No dangerous extensions configured. Attachment analysis may be ineffective.")
 
     attachments = []
-    if msg.is_multipart():
-        for part in msg.walk():
-            if part.get('Content-Disposition') and 'attachment' in part.get('Content-Disposition'):
-                filename = part.get_filename()
-                if filename:
-                    file_ext = os.path.splitext(filename)[1].lower()
-                    analysis = {
-                        'filename': filename,
-                        'file_type': file_ext,
-                        'is_dangerous': False,
-                        'contains_executable_in_zip': False
-                    }
-
-                    if file_ext in dangerous_extensions:
-                        analysis['is_dangerous'] = True
-                        logger.warning(f"Found dangerous attachment type: {filename}")
-
-                    if file_ext == '.zip':
-                        try:
-                            zip_data = part.get_payload(decode=True)
-                            with zipfile.ZipFile(io.BytesIO(zip_data)) as z:
-                                for name in z.namelist():
-                                    ext_in_zip = os.path.splitext(name)[1].lower()
-                                    if ext_in_zip in dangerous_extensions:
-                                        analysis['contains_executable_in_zip'] = True
-                                        analysis['is_dangerous'] = True
-                                        logger.warning(f"Found executable '{name}' inside zip attachment '{filename}'.")
-                                        break
-                        except Exception as e:
-                            logger.error(f"Could not inspect zip file '{filename}': {e}")
-                            
-                    attachments.append(analysis)
+    for part in parts:
+        filename = part.get_filename()
+        if filename:
+            filename_lower = filename.lower()
+            file_ext = os.path.splitext(filename_lower)[1]
+            analysis = {
+                'filename': filename,
+                'file_type': file_ext,
+                'is_dangerous': False,
+                'contains_executable_in_zip': False
+            }
+
+            if file_ext in dangerous_ext_fset:
+                analysis['is_dangerous'] = True
+                logger.warning("Found dangerous attachment type: %s", filename)
+
+            if file_ext == '.zip':
+                # Base64 inflates by 4/3; estimate the decoded size before paying for the decode.
+                estimated_size = len(part.get_payload() or '') * 3 // 4
+                if estimated_size > max_zip_inspect_bytes:
+                    logger.warning("Skipping inspection of zip attachment '%s': ~%s bytes exceeds limit of %s.", filename, estimated_size, max_zip_inspect_bytes)
+                else:
+                    try:
+                        zip_data = part.get_payload(decode=True)
+                        with zipfile.ZipFile(io.BytesIO(zip_data)) as z:
+                            for info in z.infolist():
+                                name = info.filename
+                                if name.lower().endswith(dangerous_ext_tuple):
+                                    analysis['contains_executable_in_zip'] = True
+                                    analysis['is_dangerous'] = True
+                                    logger.warning("Found executable '%s' inside zip attachment '%s'.", name, filename)
+                                    break
+                    except Exception as e:
+                        logger.error("Could not inspect zip file '%s': %s", filename, e)
+
+            attachments.append(analysis)
     
     if attachments:
-        logger.info(f"Found and analyzed {len(attachments)} attachments.")
+        logger.info("Found and analyzed %d attachments.", len(attachments))
     else:
         logger.info("No attachments found in the email.")
 
@@ -0,0 +1,118 @@
+import os
+import copy
+from collections import OrderedDict
+from dataclasses import dataclass
+from types import MappingProxyType
+from typing import Dict, Any, Tuple, FrozenSet, Mapping
+import yaml
+try:
+    from yaml import CSafeLoader as _YamlLoader
+except ImportError:
+    from yaml import SafeLoader as _YamlLoader
+
+from src.utils.logging import logger
+
+logger.info(f"Using YAML loader: {_YamlLoader.__name__}")
+
+_CACHE_MAX_ENTRIES = 100
+_CACHE: "OrderedDict[str, Tuple[float, int, Dict[str, Any], CompiledConfig]]" = OrderedDict()
+
+# Zip attachments larger than this are not opened unless the config overrides it.
+DEFAULT_MAX_ZIP_INSPECT_BYTES = 25 * 1024 * 1024
+
+
+def _freeze(value: Any) -> Any:
+    """Read-only deep copy: mappings become MappingProxyType, lists become tuples."""
+    if isinstance(value, dict):
+        return MappingProxyType({key: _freeze(item) for key, item in value.items()})
+    if isinstance(value, list):
+        return tuple(_freeze(item) for item in value)
+    return value
+
+
+@dataclass(frozen=True)
+class CompiledConfig:
+    """
+    Normalised, read-only view of the settings used on every email.
+    Built once per config file so the analysis modules do not rebuild sets per call.
+    """
+    dangerous_ext_fset: FrozenSet[str]
+    dangerous_ext_tuple: Tuple[str, ...]
+    max_zip_inspect_bytes: int
+    score_weights: Mapping[str, Any]
+    thresholds: Mapping[str, Any]
+
+    @classmethod
+    def from_dict(cls, config: Dict[str, Any]) -> "CompiledConfig":
+        """Builds the compiled view from a raw configuration dictionary."""
+        attachment_config = config.get('attachment_analysis', {})
+        # Normalised to lowercase '.ext' so suffix checks are a single str.endswith call.
+        dangerous_ext_tuple = tuple(
+            ext.lower() if ext.startswith('.') else '.' + ext.lower()
+            for ext in attachment_config.get('dangerous_extensions', [])
+        )
+        return cls(
+            dangerous_ext_fset=frozenset(dangerous_ext_tuple),
+            dangerous_ext_tuple=dangerous_ext_tuple,
+            max_zip_inspect_bytes=attachment_config.get('max_zip_inspect_bytes', DEFAULT_MAX_ZIP_INSPECT_BYTES),
+            # Frozen copies: the raw dict is the cached one that load_config() copies from.
+            score_weights=_freeze(config.get('scoring', {}).get('weights', {})),
+            thresholds=_freeze(config.get('thresholds', {}))
+        )
+
+
+def _load_entry(config_path: str):
+    """Returns the (mtime, size, config, compiled) cache entry for a path, or None."""
+    try:
+        st = os.stat(config_path)
+    except FileNotFoundError:
+        logger.error(f"Configuration file not found at: {config_path}")
+        return None
+
+    cached = _CACHE.get(config_path)
+    if cached is not None and cached[0] == st.st_mtime and cached[1] == st.st_size:
+        _CACHE.move_to_end(config_path)
+        return cached
+
+    try:
+        with open(config_path, 'r') as f:
+            config = yaml.load(f, Loader=_YamlLoader) or {}
+    except FileNotFoundError:
+        logger.error(f"Configuration file not found at: {config_path}")
+        return None
+    except yaml.YAMLError as e:
+        logger.error(f"Error parsing YAML configuration file: {e}")
+        return None
+
+    entry = (st.st_mtime, st.st_size, config, CompiledConfig.from_dict(config))
+    _CACHE[config_path] = entry
+    _CACHE.move_to_end(config_path)
+    if len(_CACHE) > _CACHE_MAX_ENTRIES:
+        _CACHE.popitem(last=False)
+
+    logger.info("Configuration file loaded successfully.")
+    return entry
+
+
+def load_config(config_path: str = 'config/config.yaml') -> Dict[str, Any]:
+    """
+    Loads a YAML configuration file.
+
+    Parsed files are cached by (mtime, size); an unchanged file is served from
+    the cache as a deep copy so callers can never mutate the cached dict.
+    """
+    entry = _load_entry(config_path)
+    if entry is None:
+        return {}
+    return copy.deepcopy(entry[2])
+
+
+def load_compiled_config(config_path: str = 'config/config.yaml') -> CompiledConfig:
+    """
+    Returns the CompiledConfig for a configuration file, built once per parse.
+    An empty compiled config is returned if the file cannot be loaded.
+    """
+    entry = _load_entry(config_path)
+    if entry is None:
+        return CompiledConfig.from_dict({})
+    return entry[3]
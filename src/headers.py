@@ -6,9 +6,49 @@ import dns.resolver
 import dkim
 import spf
 import ipaddress
+import functools
+from concurrent.futures import ThreadPoolExecutor
 
 from src.utils.logging import logger
 
+_TRUSTED_RELAYS = (
+    'google.com',
+    'google.co.uk',
+    'outlook.com',
+    'office365.com',
+    'mailgun.org',
+    'sendgrid.net',
+    'amazonses.com',
+    'zohomail.com'
+)
+
+def _build_resolver() -> dns.resolver.Resolver:
+    """
+    Creates the shared caching resolver. Without a system resolver configuration it
+    falls back to an unconfigured one, so lookups fail per check (as 'dns_error')
+    instead of the import failing.
+    """
+    try:
+        resolver = dns.resolver.Resolver()
+    except dns.resolver.NoResolverConfiguration as e:
+        logger.warning("No DNS resolver configuration found, DNS-based header checks will fail: %s", e)
+        resolver = dns.resolver.Resolver(configure=False)
+    resolver.cache = dns.resolver.LRUCache(max_size=2048)
+    return resolver
+
+
+# One cached resolver for the whole process. It is also installed as dnspython's
+# default so pyspf (which resolves through dns.resolver) shares the same cache.
+_RESOLVER = _build_resolver()
+dns.resolver.default_resolver = _RESOLVER
+
+# Shared pool for the DKIM/DMARC/SPF lookups; they block on DNS, not the GIL.
+_NETWORK_EXECUTOR = ThreadPoolExecutor(max_workers=4)
+
+_FROM_RE = re.compile(
+    r"from\s+([\w\.-]+)\s+\(.*?\[([0-9a-fA-F:\.]+)\]\)", re.IGNORECASE
+)
+
 
 def _get_domain_from_email(address: str) -> Optional[str]:
     """Robustly extracts the domain from an email address string."""
@@ -20,50 +60,39 @@ def _get_domain_from_email(address: str) -> Optional[str]:
     return None
 
 
+@functools.lru_cache(maxsize=4096)
+def _is_public_ip(ip_str: str) -> bool:
+    """
+    True if ip_str is a valid address that is not private, loopback or reserved.
+    Memoized because the same relay IPs recur across many messages.
+    """
+    try:
+        ip_obj = ipaddress.ip_address(ip_str)
+    except ValueError:
+        return False
+    return not (ip_obj.is_private or ip_obj.is_loopback or ip_obj.is_reserved)
+
+
 def _get_connecting_ip(msg: Message) -> Optional[str]:
     """
     Walks the 'Received' headers to find the first untrusted public IP address.
     Starts from the last header (closest to sender).
     """
-    TRUSTED_RELAYS = [
-        'google.com',
-        'google.co.uk',
-        'outlook.com',
-        'office365.com',  
-        'mailgun.org',
-        'sendgrid.net',
-        'amazonses.com',
-        'zohomail.com'
-    ]
-
     received_headers = msg.get_all('Received', [])
     if not received_headers:
         return None
 
-   
-    from_pattern = re.compile(
-        r"from\s+([\w\.-]+)\s+\(.*?\[([0-9a-fA-F:\.]+)\]\)", re.IGNORECASE
-    )
-
     for header in reversed(received_headers):
-        match = from_pattern.search(header)
+        match = _FROM_RE.search(header)
         if not match:
             continue
 
         host, ip_str = match.groups()
-        try:
-            ip_obj = ipaddress.ip_address(ip_str)
-        except ValueError:
-            continue  
-
-       
-        if ip_obj.is_private or ip_obj.is_loopback or ip_obj.is_reserved:
+        if not _is_public_ip(ip_str):
             continue
 
-
-        is_trusted = any(host.endswith(trusted_domain) for trusted_domain in TRUSTED_RELAYS)
-        if not is_trusted:
-            logger.info(f"Found untrusted IP: {ip_str} (host: {host})")
+        if not host.endswith(_TRUSTED_RELAYS):
+            logger.info("Found untrusted IP: %s (host: %s)", ip_str, host)
             return ip_str
 
     logger.warning("No untrusted public IP found in Received headers.")
@@ -75,20 +104,20 @@ def _check_dmarc(domain: str) -> str:
     if not domain:
         return 'not_found'
     try:
-        dmarc_record = dns.resolver.resolve(f'_dmarc.{domain}', 'TXT')
+        dmarc_record = _RESOLVER.resolve(f'_dmarc.{domain}', 'TXT', lifetime=3.0)
         for record in dmarc_record:
             if b'v=DMARC1' in record.to_wire():
-                logger.info(f"Found DMARC record for {domain}")
+                logger.info("Found DMARC record for %s", domain)
                 return 'pass'
         return 'fail'
     except (dns.resolver.NoAnswer, dns.resolver.NXDOMAIN):
-        logger.warning(f"No DMARC record found for {domain}")
+        logger.warning("No DMARC record found for %s", domain)
         return 'not_found'
     except (dns.exception.Timeout, dns.resolver.NoNameservers) as e:
-        logger.error(f"DNS timeout or network error during DMARC check for {domain}: {e}")
+        logger.error("DNS timeout or network error during DMARC check for %s: %s", domain, e)
         return 'dns_error'
     except Exception as e:
-        logger.error(f"Error checking DMARC for {domain}: {e}")
+        logger.error("Error checking DMARC for %s: %s", domain, e)
         return 'error'
 
 
@@ -98,19 +127,51 @@ def _check_spf(ip: str, domain: str, sender: str) -> str:
         return 'not_checked'
     try:
         result, _ = spf.check2(i=ip, s=sender, h=domain)
-        logger.info(f"SPF check for IP {ip}, sender {sender}, domain {domain} resulted in: {result}")
+        logger.info("SPF check for IP %s, sender %s, domain %s resulted in: %s", ip, sender, domain, result)
         return result
     except (dns.exception.Timeout, dns.resolver.NoNameservers) as e:
-        logger.error(f"DNS timeout or network error during SPF check for {domain}: {e}")
+        logger.error("DNS timeout or network error during SPF check for %s: %s", domain, e)
         return 'dns_error'
     except Exception as e:
-        logger.error(f"An unexpected error occurred during SPF check for {domain}: {e}")
+        logger.error("An unexpected error occurred during SPF check for %s: %s", domain, e)
+        return 'error'
+
+
+def _resolver_txt(name, timeout=5) -> Optional[bytes]:
+    """
+    dkimpy dnsfunc: fetches a selector's TXT record through the shared resolver.
+    Repeat senders hit the resolver's cache, which expires keys with their DNS TTL.
+    """
+    if isinstance(name, bytes):
+        name = name.decode('utf-8')
+    try:
+        answer = _RESOLVER.resolve(name, 'TXT', lifetime=timeout)
+    except (dns.resolver.NoAnswer, dns.resolver.NXDOMAIN):
+        return None
+    for record in answer:
+        return b''.join(record.strings)
+    return None
+
+
+def _check_dkim(raw_email: bytes) -> str:
+    """Verifies the DKIM signature of the raw email bytes."""
+    try:
+        is_dkim_valid = dkim.verify(raw_email, dnsfunc=_resolver_txt)
+        result = 'pass' if is_dkim_valid else 'fail'
+        logger.info("DKIM verification result: %s", result)
+        return result
+    except (dkim.DKIMException, dns.exception.Timeout, dns.resolver.NoNameservers) as e:
+        logger.warning("DKIM verification failed (signature/DNS error): %s", e)
+        return 'fail'
+    except Exception as e:
+        logger.error("Unexpected error during DKIM verification: %s", e)
         return 'error'
 
 
 def analyze_headers(msg: Message, raw_email: bytes) -> Dict[str, Any]:
     """
     Analyzes email headers for signs of phishing using real-world checks.
+    The DKIM, DMARC and SPF lookups are independent and run concurrently.
     """
     results = {
         'spf_result': 'not_checked',
@@ -121,44 +182,37 @@ def analyze_headers(msg: Message, raw_email: bytes) -> Dict[str, Any]:
         'return_path': msg.get('Return-Path')
     }
 
-    # --- 1. DKIM Verification ---
-    try:
-        is_dkim_valid = dkim.verify(raw_email)
-        results['dkim_result'] = 'pass' if is_dkim_valid else 'fail'
-        logger.info(f"DKIM verification result: {results['dkim_result']}")
-    except (dkim.DKIMException, dns.exception.Timeout, dns.resolver.NoNameservers) as e:
-        results['dkim_result'] = 'fail'
-        logger.warning(f"DKIM verification failed (signature/DNS error): {e}")
-    except Exception as e:
-        results['dkim_result'] = 'error'
-        logger.error(f"Unexpected error during DKIM verification: {e}")
-
-    # --- 2. From/Return-Path Mismatch ---
+    # --- 1. From/Return-Path Mismatch ---
     from_domain = _get_domain_from_email(results['from'])
     return_path_domain = _get_domain_from_email(results['return_path'])
     if from_domain and return_path_domain and from_domain != return_path_domain:
         results['from_return_path_mismatch'] = True
-        logger.warning(f"Mismatch: From domain ({from_domain}) vs Return-Path domain ({return_path_domain})")
+        logger.warning("Mismatch: From domain (%s) vs Return-Path domain (%s)", from_domain, return_path_domain)
 
-    # --- 3. DMARC Check ---
-    if from_domain:
-        results['dmarc_result'] = _check_dmarc(from_domain)
-
-    # --- 4. SPF Check ---
     connecting_ip = _get_connecting_ip(msg)
     spf_sender = results['return_path']
     if spf_sender:
         spf_sender = spf_sender.strip('<>')
 
+    # --- 2. DKIM, DMARC and SPF checks (network-bound, run in parallel) ---
+    # Unsigned mail cannot pass DKIM; skip canonicalization and the key lookup.
+    fut_dkim = _NETWORK_EXECUTOR.submit(_check_dkim, raw_email) if msg.get('DKIM-Signature') else None
+    fut_dmarc = _NETWORK_EXECUTOR.submit(_check_dmarc, from_domain) if from_domain else None
+    fut_spf = None
     if connecting_ip and return_path_domain and spf_sender:
-        results['spf_result'] = _check_spf(
+        fut_spf = _NETWORK_EXECUTOR.submit(
+            _check_spf,
             ip=connecting_ip,
             domain=return_path_domain,
             sender=spf_sender
         )
 
+    if fut_dkim is not None:
+        results['dkim_result'] = fut_dkim.result()
+    if fut_dmarc is not None:
+        results['dmarc_result'] = fut_dmarc.result()
+    if fut_spf is not None:
+        results['spf_result'] = fut_spf.result()
+
     logger.info("Header analysis complete.")
     return results
-
-
-
@@ -1,71 +1,153 @@
 import os
-import email
-from typing import Optional
+import threading
+from collections import OrderedDict
+from typing import Optional, Dict, Any, Tuple
 from email.message import Message
+from email.parser import BytesParser
+from email.policy import default
 from src.utils.logging import logger
 
+# The modern policy decodes RFC 2047 / 8-bit headers into plain str values
+# instead of email.header.Header objects, which keeps results JSON-serializable.
+_PARSER = BytesParser(policy=default)
+
+# Raw bytes of recently read files, keyed by path and validated by (mtime, size).
+# Bounded by total size so large batches cannot pin attachments in memory.
+_RAW_CACHE_MAX_BYTES = 32 * 1024 * 1024
+_RAW_CACHE: "OrderedDict[str, Tuple[float, int, bytes]]" = OrderedDict()
+_raw_cache_bytes = 0
+_RAW_CACHE_LOCK = threading.Lock()
+
+def read_email_bytes(file_path: str) -> bytes:
+    """
+    Reads an .eml file's raw bytes. Parsing and DKIM verification of the same file
+    share one read through a small size-bounded cache.
+    """
+    global _raw_cache_bytes
+    st = os.stat(file_path)
+    with _RAW_CACHE_LOCK:
+        cached = _RAW_CACHE.get(file_path)
+        if cached is not None and cached[0] == st.st_mtime and cached[1] == st.st_size:
+            _RAW_CACHE.move_to_end(file_path)
+            return cached[2]
+
+    with open(file_path, 'rb') as f:
+        data = f.read()
+
+    if len(data) <= _RAW_CACHE_MAX_BYTES:
+        with _RAW_CACHE_LOCK:
+            previous = _RAW_CACHE.pop(file_path, None)
+            if previous is not None:
+                _raw_cache_bytes -= len(previous[2])
+            _RAW_CACHE[file_path] = (st.st_mtime, st.st_size, data)
+            _raw_cache_bytes += len(data)
+            while _raw_cache_bytes > _RAW_CACHE_MAX_BYTES:
+                _, (_, _, evicted) = _RAW_CACHE.popitem(last=False)
+                _raw_cache_bytes -= len(evicted)
+    return data
+
 def parse_email_file(file_path: str) -> Optional[Message]:
-    """Parses an .eml file from a file path."""
+    """
+    Parses an .eml file from a file path.
+    Each call returns a freshly parsed message; only the raw bytes are cached.
+    """
     if not os.path.exists(file_path):
-        logger.error(f"File not found: {file_path}")
+        logger.error("File not found: %s", file_path)
         return None
     try:
-        with open(file_path, 'r', encoding='utf-8', errors='ignore') as f:
-            msg = email.message_from_file(f)
-        logger.info(f"Successfully parsed email file: {file_path}")
+        msg = _PARSER.parsebytes(read_email_bytes(file_path))
+        logger.info("Successfully parsed email file: %s", file_path)
         return msg
     except Exception as e:
-        logger.error(f"Could not parse email file {file_path}: {e}")
+        logger.error("Could not parse email file %s: %s", file_path, e)
         return None
 
 def parse_email_from_string(raw_email: str) -> Optional[Message]:
     """Parses an email from a raw string."""
     try:
-        msg = email.message_from_string(raw_email)
+        msg = _PARSER.parsebytes(raw_email.encode('utf-8', errors='ignore'))
         logger.info("Successfully parsed email from raw string.")
         return msg
     except Exception as e:
-        logger.error(f"Could not parse email from raw string: {e}")
+        logger.error("Could not parse email from raw string: %s", e)
+        return None
+
+def parse_email_from_bytes(raw_email: bytes) -> Optional[Message]:
+    """Parses an email from raw bytes, e.g. the exact bytes later used for DKIM."""
+    try:
+        msg = _PARSER.parsebytes(raw_email)
+        logger.info("Successfully parsed email from raw bytes.")
+        return msg
+    except Exception as e:
+        logger.error("Could not parse email from raw bytes: %s", e)
         return None
 
+def _decode_body_part(part: Optional[Message]) -> str:
+    """Decodes a body part's payload, falling back to latin-1 for non-UTF-8 bytes."""
+    if part is None:
+        return ""
+    payload = part.get_payload(decode=True)
+    if not payload:
+        return ""
+    try:
+        return payload.decode('utf-8')
+    except UnicodeDecodeError:
+        return payload.decode('latin-1', errors='ignore')
+
+def walk_once(msg: Message) -> Dict[str, Any]:
+    """
+    Traverses the MIME tree a single time and collects everything the pipeline needs:
+    the first HTML and plain-text body parts and all attachment parts.
+    """
+    parts = {'html': None, 'plain': None, 'attachments': []}
+    if not msg.is_multipart():
+        parts['html' if msg.get_content_type() == "text/html" else 'plain'] = msg
+        return parts
+
+    for part in msg.walk():
+        # Containers only group their children, which walk() visits anyway.
+        if part.get_content_maintype() == "multipart":
+            continue
+
+        if "attachment" in part.get("Content-Disposition", ""):
+            parts['attachments'].append(part)
+            continue
+
+        content_type = part.get_content_type()
+        if content_type == "text/html" and parts['html'] is None:
+            parts['html'] = part
+        elif content_type == "text/plain" and parts['plain'] is None:
+            parts['plain'] = part
+    return parts
+
+def get_email_body_from_parts(parts: Dict[str, Any]) -> str:
+    """Extracts the body from the output of walk_once, preferring HTML over plain text."""
+    body = _decode_body_part(parts['html'] or parts['plain'])
+    logger.info("Successfully extracted email body.")
+    return body
+
 def get_email_body(msg: Message) -> str:
     """
     Robustly extracts the text or HTML body from an email.Message object.
     It prioritizes HTML over plain text.
     """
-    body = ""
-    if msg.is_multipart():
-        html_part = None
-        plain_part = None
-        for part in msg.walk():
-            content_type = part.get_content_type()
-            content_disposition = str(part.get("Content-Disposition"))
-
-            if "attachment" in content_disposition:
-                continue
-
-            if content_type == "text/html":
-                html_part = part
-            elif content_type == "text/plain":
-                plain_part = part
-
-        target_part = html_part if html_part else plain_part
-        
-        if target_part:
-            payload = target_part.get_payload(decode=True)
-            if payload:
-                try:
-                    body = payload.decode('utf-8')
-                except UnicodeDecodeError:
-                    body = payload.decode('latin-1', errors='ignore')
-    else:
-        payload = msg.get_payload(decode=True)
-        if payload:
-            try:
-                body = payload.decode('utf-8')
-            except UnicodeDecodeError:
-                body = payload.decode('latin-1', errors='ignore')
+    if not msg.is_multipart():
+        body = _decode_body_part(msg)
+        logger.info("Successfully extracted email body.")
+        return body
 
-    logger.info("Successfully extracted email body.")
-    return body
+    html_part = None
+    plain_part = None
+    for part in msg.walk():
+        if "attachment" in part.get("Content-Disposition", ""):
+            continue
+
+        content_type = part.get_content_type()
+        if content_type == "text/html":
+            # HTML wins over plain text, so the rest of the tree is irrelevant.
+            html_part = part
+            break
+        elif content_type == "text/plain" and plain_part is None:
+            plain_part = part
 
+    return get_email_body_from_parts({'html': html_part, 'plain': plain_part})
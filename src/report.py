@@ -1,7 +1,11 @@
 import json
 import os
+try:
+    import orjson
+except ImportError:
+    orjson = None
 from datetime import datetime
-from typing import Dict, Any
+from typing import Dict, Any, Optional
 
 from src.utils.logging import logger
 
@@ -11,7 +15,8 @@ def generate_report(
     url_results: list,
     attachment_results: list,
     score_results: Dict[str, Any],
-    output_dir: str
+    output_dir: str,
+    risk_level: Optional[str] = None
 ) -> None:
     """
     Generates a JSON report of the analysis.
@@ -23,27 +28,30 @@ def generate_report(
         attachment_results (list): Attachment analysis results.
         score_results (Dict[str, Any]): Scoring results.
         output_dir (str): Directory to save the report.
+        risk_level (Optional[str]): Risk level already determined by the caller; computed here if omitted.
     """
-    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    now = datetime.now()
+    timestamp = now.strftime("%Y%m%d_%H%M%S")
     email_filename = os.path.basename(email_path)
     report_filename = f"{os.path.splitext(email_filename)[0]}_{timestamp}.json"
     report_path = os.path.join(output_dir, report_filename)
 
     # Determine risk level
     score = score_results['total_score']
-    if score > 80:
-        risk_level = 'High'
-    elif score > 50:
-        risk_level = 'Medium'
-    elif score > 20:
-        risk_level = 'Low'
-    else:
-        risk_level = 'Very Low'
+    if risk_level is None:
+        if score > 80:
+            risk_level = 'High'
+        elif score > 50:
+            risk_level = 'Medium'
+        elif score > 20:
+            risk_level = 'Low'
+        else:
+            risk_level = 'Very Low'
 
     report_data = {
         'metadata': {
             'email_file': email_path,
-            'analysis_timestamp': datetime.now().isoformat(),
+            'analysis_timestamp': now.isoformat(),
             'report_file': report_path
         },
         'summary': {
@@ -60,11 +68,22 @@ def generate_report(
 
     try:
         os.makedirs(output_dir, exist_ok=True)
-        with open(report_path, 'w') as f:
-            json.dump(report_data, f, indent=4)
-        logger.info(f"Successfully generated report at {report_path}")
+        if orjson is not None:
+            report_bytes = orjson.dumps(report_data, option=orjson.OPT_INDENT_2)
+        else:
+            report_bytes = json.dumps(report_data, indent=4).encode('utf-8')
+        # Unbuffered write of the fully serialized report; os.write may be partial.
+        fd = os.open(report_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644)
+        try:
+            view = memoryview(report_bytes)
+            written = 0
+            while written < len(view):
+                written += os.write(fd, view[written:])
+        finally:
+            os.close(fd)
+        logger.info("Successfully generated report at %s", report_path)
     except Exception as e:
-        logger.error(f"Failed to write report to {report_path}: {e}")
+        logger.error("Failed to write report to %s: %s", report_path, e)
 
 if __name__ == '__main__':
     # Dummy data for testing
@@ -1,47 +1,58 @@
-from typing import Dict, Any, List
+from collections import Counter
+from typing import Dict, Any, List, Iterator, Tuple, Union
 
 from src.utils.logging import logger
 
-def calculate_risk_score(
-    header_results: Dict[str, Any],
-    url_results: List[Dict[str, Any]],
-    attachment_results: List[Dict[str, Any]],
-    weights: Dict[str, Any]
-) -> Dict[str, Any]:
-    """
-    Calculates a risk score based on analysis results and predefined weights.
+MAX_SCORE = 100
 
-    Args:
-        header_results (Dict[str, Any]): Results from header analysis.
-        url_results (List[Dict[str, Any]]): Results from URL analysis.
-        attachment_results (List[Dict[str, Any]]): Results from attachment analysis.
-        weights (Dict[str, Any]): A dictionary of weights for scoring.
+# (header result key, value that triggers the rule, weight key, breakdown reason)
+_HEADER_RULES = (
+    ('spf_result', 'fail', 'spf_fail', 'SPF Check Failed'),
+    ('dkim_result', 'fail', 'dkim_fail', 'DKIM Check Failed'),
+    ('dmarc_result', 'fail', 'dmarc_fail', 'DMARC Check Failed'),
+    ('from_return_path_mismatch', True, 'from_return_path_mismatch', 'From/Return-Path Mismatch'),
+)
 
-    Returns:
-        Dict[str, Any]: A dictionary containing the total score and breakdown.
+# (URL suspicion reason, weight key, breakdown reason)
+_URL_REASON_RULES = (
+    ('USES_URL_SHORTENER', 'shortened_url', 'URL is Shortened'),
+    ('IP_ADDRESS_IN_HOST', 'ip_address_url', 'URL is IP Address'),
+)
+
+# (attachment flag, weight key, breakdown reason)
+_ATTACHMENT_RULES = (
+    ('is_dangerous', 'dangerous_file_type', 'Dangerous Attachment Type'),
+    ('contains_executable_in_zip', 'zip_with_executable', 'Zip Contains Executable'),
+)
+
+def _damping_quarters(count: int) -> int:
     """
-    total_score = 0
-    score_breakdown = []
+    Total multiplier, in quarters, for a reason family matched `count` times:
+    min(1.5, 1 + 0.25 * (count - 1)), i.e. 4, 5, 6, 6, ... quarters.
+    """
+    if count <= 0:
+        return 0
+    return min(6, 4 + (count - 1))
 
+def _iter_findings(
+    header_results: Dict[str, Any],
+    url_results: List[Dict[str, Any]],
+    attachment_results: List[Dict[str, Any]],
+    weights: Dict[str, Any]
+) -> Iterator[Tuple[str, int, str]]:
+    """Lazily yields (family, weight, reason) for every matched rule, in breakdown order."""
     header_weights = weights.get('headers', {})
     url_weights = weights.get('urls', {})
     attachment_weights = weights.get('attachments', {})
 
     # --- Header Score ---
-    if header_results.get('spf_result') == 'fail':
-        total_score += header_weights.get('spf_fail', 0)
-        score_breakdown.append({'reason': 'SPF Check Failed', 'score': header_weights.get('spf_fail', 0)})
-    if header_results.get('dkim_result') == 'fail':
-        total_score += header_weights.get('dkim_fail', 0)
-        score_breakdown.append({'reason': 'DKIM Check Failed', 'score': header_weights.get('dkim_fail', 0)})
-    if header_results.get('dmarc_result') == 'fail':
-        total_score += header_weights.get('dmarc_fail', 0)
-        score_breakdown.append({'reason': 'DMARC Check Failed', 'score': header_weights.get('dmarc_fail', 0)})
-    if header_results.get('from_return_path_mismatch'):
-        total_score += header_weights.get('from_return_path_mismatch', 0)
-        score_breakdown.append({'reason': 'From/Return-Path Mismatch', 'score': header_weights.get('from_return_path_mismatch', 0)})
-
-    # --- URL Score (Corrected Logic) ---
+    for result_key, trigger, weight_key, label in _HEADER_RULES:
+        if header_results.get(result_key) == trigger:
+            yield weight_key, header_weights.get(weight_key, 0), label
+
+    # --- URL Score ---
+    suspicious_weight = url_weights.get('suspicious_domain', 0)
+    url_rules = [(reason, weight_key, url_weights.get(weight_key, 0), label) for reason, weight_key, label in _URL_REASON_RULES]
     scored_urls = set() # To avoid scoring the same URL multiple times for different reasons
     for url in url_results:
         reasons = url.get('suspicion_reasons', [])
@@ -49,38 +60,88 @@ def calculate_risk_score(
 
         # General suspicious score if any reason is present and not already scored
         if url.get('is_suspicious') and original_url not in scored_urls:
-             total_score += url_weights.get('suspicious_domain', 0)
-             score_breakdown.append({'reason': f'Suspicious URL ({original_url})', 'score': url_weights.get('suspicious_domain', 0)})
-             scored_urls.add(original_url)
+            scored_urls.add(original_url)
+            yield 'suspicious_domain', suspicious_weight, f'Suspicious URL ({original_url})'
 
         # Specific scores based on reasons
-        if "USES_URL_SHORTENER" in reasons:
-            total_score += url_weights.get('shortened_url', 0)
-            score_breakdown.append({'reason': f'URL is Shortened ({original_url})', 'score': url_weights.get('shortened_url', 0)})
-        
-        if "IP_ADDRESS_IN_HOST" in reasons:
-            total_score += url_weights.get('ip_address_url', 0)
-            score_breakdown.append({'reason': f'URL is IP Address ({original_url})', 'score': url_weights.get('ip_address_url', 0)})
-
+        for reason, weight_key, w, label in url_rules:
+            if reason in reasons:
+                yield weight_key, w, f'{label} ({original_url})'
 
     # --- Attachment Score ---
+    attachment_rules = [(flag, weight_key, attachment_weights.get(weight_key, 0), label) for flag, weight_key, label in _ATTACHMENT_RULES]
     for att in attachment_results:
-        if att.get('is_dangerous'):
-            total_score += attachment_weights.get('dangerous_file_type', 0)
-            score_breakdown.append({'reason': f'Dangerous Attachment Type ({att["filename"]})', 'score': attachment_weights.get('dangerous_file_type', 0)})
-        if att.get('contains_executable_in_zip'):
-            total_score += attachment_weights.get('zip_with_executable', 0)
-            score_breakdown.append({'reason': f'Zip Contains Executable ({att["filename"]})', 'score': attachment_weights.get('zip_with_executable', 0)})
+        for flag, weight_key, w, label in attachment_rules:
+            if att.get(flag):
+                yield weight_key, w, f'{label} ({att["filename"]})'
+
+def calculate_risk_score(
+    header_results: Dict[str, Any],
+    url_results: List[Dict[str, Any]],
+    attachment_results: List[Dict[str, Any]],
+    weights: Dict[str, Any]
+) -> Dict[str, Any]:
+    """
+    Calculates a risk score based on analysis results and predefined weights.
+
+    Repeated findings of the same family are damped: the family as a whole scores
+    at most 1.5x its weight. Scoring stops as soon as the score reaches the cap.
+
+    Args:
+        header_results (Dict[str, Any]): Results from header analysis.
+        url_results (List[Dict[str, Any]]): Results from URL analysis.
+        attachment_results (List[Dict[str, Any]]): Results from attachment analysis.
+        weights (Dict[str, Any]): A dictionary of weights for scoring.
+
+    Returns:
+        Dict[str, Any]: A dictionary containing the total score and breakdown.
+    """
+    total_score = 0
+    score_breakdown: List[Tuple[str, Union[int, float]]] = [] # (reason, score); dicts are built once at the end
+    family_counts = Counter()
+
+    for family, w, reason in _iter_findings(header_results, url_results, attachment_results, weights):
+        if not w:
+            continue
+        family_counts[family] += 1
+        count = family_counts[family]
+        quarters = w * (_damping_quarters(count) - _damping_quarters(count - 1))
+        if not quarters:
+            continue # Family already saturated
+        score = quarters // 4 if quarters % 4 == 0 else quarters / 4
+        total_score += score
+        score_breakdown.append((reason, score))
+        if total_score >= MAX_SCORE:
+            break
 
     # Cap the score at 100
-    final_score = min(total_score, 100)
-    logger.info(f"Calculated final risk score: {final_score}")
+    final_score = min(int(total_score + 0.5), MAX_SCORE) # Half-up; round() would send 12.5 to 12 but 13.5 to 14
+    logger.info("Calculated final risk score: %s", final_score)
     
     return {
         'total_score': final_score,
-        'breakdown': score_breakdown
+        'breakdown': [{'reason': reason, 'score': score} for reason, score in score_breakdown]
     }
 
+def determine_risk_level(score: int, thresholds: Dict[str, Any]) -> str:
+    """
+    Maps a risk score to a risk level using the configured thresholds.
+
+    Args:
+        score (int): The total risk score.
+        thresholds (Dict[str, Any]): The 'thresholds' block of the configuration.
+
+    Returns:
+        str: One of 'High', 'Medium', 'Low' or 'Very Low'.
+    """
+    if score >= thresholds.get('high', 80):
+        return "High"
+    if score >= thresholds.get('medium', 60):
+        return "Medium"
+    if score >= thresholds.get('low', 30):
+        return "Low"
+    return "Very Low"
+
 if __name__ == '__main__':
     import json
 
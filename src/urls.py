@@ -1,17 +1,159 @@
 import re
-from typing import List, Dict, Any, Tuple, Optional
-from urllib.parse import urlparse, unquote
-from bs4 import BeautifulSoup
+import os
+import json
+import time
+import sqlite3
+import threading
+import functools
+import contextlib
+from typing import List, Dict, Any, Tuple, Optional, FrozenSet, Callable
+from html import unescape as html_unescape
+from urllib.parse import urlparse, unquote, ParseResult
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 import whois
-from datetime import datetime
-from concurrent.futures import ThreadPoolExecutor, as_completed
+try:
+    from lxml import html as lxml_html
+    from lxml import etree as lxml_etree
+except ImportError:
+    lxml_html = None
+try:
+    import tldextract
+except ImportError:
+    tldextract = None
+try:
+    import ahocorasick
+except ImportError:
+    ahocorasick = None
+from datetime import datetime, timezone
+from concurrent.futures import ThreadPoolExecutor, Future, as_completed
 
 from src.utils.logging import logger
 
-_whois_cache: Dict[str, Any] = {}
+WHOIS_CACHE_PATH = os.path.join('outputs', 'artifacts', 'whois_cache.sqlite3')
+WHOIS_CACHE_TTL = 7 * 24 * 3600  # seconds
+TOP_DOMAINS_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'data', 'top_domains.txt')
+TOP_DOMAIN_AGE_DAYS = 9999
+
+
+class WhoisCache:
+    """
+    SQLite-backed cache of WHOIS domain ages, shared across runs.
+    Entries expire after `ttl` seconds. Safe to use from the URL worker threads.
+    """
+
+    def __init__(self, path: str = WHOIS_CACHE_PATH, ttl: float = WHOIS_CACHE_TTL):
+        self.path = path
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+
+    def _connect(self) -> sqlite3.Connection:
+        # Opened lazily so importing this module never touches the filesystem.
+        if self._conn is None:
+            try:
+                os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+                self._conn = sqlite3.connect(self.path, check_same_thread=False)
+            except (OSError, sqlite3.Error) as e:
+                logger.warning("Could not open WHOIS cache at %s, using an in-memory cache: %s", self.path, e)
+                self._conn = sqlite3.connect(':memory:', check_same_thread=False)
+            self._conn.execute(
+                'CREATE TABLE IF NOT EXISTS whois '
+                '(domain TEXT PRIMARY KEY, age_days INTEGER, reasons TEXT, fetched_at REAL)'
+            )
+            self._conn.commit()
+        return self._conn
+
+    def get(self, domain: str) -> Optional[Tuple[Optional[int], List[str]]]:
+        """Returns the cached (age, reasons) for a domain, or None if missing or expired."""
+        try:
+            with self._lock:
+                row = self._connect().execute(
+                    'SELECT age_days, reasons, fetched_at FROM whois WHERE domain = ?', (domain,)
+                ).fetchone()
+        except sqlite3.Error as e:
+            logger.warning("WHOIS cache read failed for %s: %s", domain, e)
+            return None
+        if row is None:
+            return None
+        age, reasons, fetched_at = row
+        elapsed = time.time() - fetched_at
+        if elapsed >= self.ttl:
+            return None
+        # The domain has kept ageing since the lookup.
+        if age is not None:
+            age += int(elapsed // 86400)
+        return age, json.loads(reasons)
+
+    def set(self, domain: str, age: Optional[int], reasons: List[str]) -> None:
+        """Stores the WHOIS result for a domain."""
+        try:
+            with self._lock:
+                conn = self._connect()
+                conn.execute(
+                    'INSERT OR REPLACE INTO whois (domain, age_days, reasons, fetched_at) VALUES (?, ?, ?, ?)',
+                    (domain, age, json.dumps(reasons), time.time())
+                )
+                conn.commit()
+        except sqlite3.Error as e:
+            logger.warning("WHOIS cache write failed for %s: %s", domain, e)
+
+
+_whois_cache = WhoisCache()
+# Failed lookups are only remembered for the lifetime of the process.
+_whois_failures: Dict[str, Tuple[Optional[int], List[str]]] = {}
 _url_resolution_cache: Dict[str, str] = {}
 
+# This pattern is more specific and avoids including trailing characters like '<' or '>'
+_URL_RE = re.compile(r'\b(?:https?://|www\.)[^\s<>"]+', re.IGNORECASE)
+# Sentence punctuation that the greedy pattern above picks up after a URL
+_URL_TRAILING_PUNCTUATION = '.,;:!?)\''
+# Element attributes that carry a link target (anchors, image maps, form submissions)
+_LINK_ATTRIBUTES = ('href', 'action', 'formaction')
+# Raw-markup fallbacks for content the HTML parser drops after the document end
+_DOCUMENT_END_RE = re.compile(r'</(?:body|html)\b', re.IGNORECASE)
+_LINK_ATTRIBUTE_RE = re.compile(
+    r'\b(?:href|action|formaction)\s*=\s*(?:"([^"]*)"|\'([^\']*)\'|([^\s>]+))', re.IGNORECASE
+)
+
+_USER_AGENT = 'PhishingDetector/1.0'
+_MAX_REDIRECTS = 5
+_HOST_CONCURRENCY = 2
+_RETRY_AFTER_CAP = 3  # seconds
+
+# At most _HOST_CONCURRENCY resolves in flight per target host (e.g. one shortener).
+# Entries are [semaphore, users] and are dropped once no thread holds or awaits them.
+_host_slots: Dict[str, List[Any]] = {}
+_host_slots_lock = threading.Lock()
+
+_IP_RE = re.compile(r'^\d{1,3}(?:\.\d{1,3}){3}$')
+
+
+# Offline extractor: uses the public suffix list bundled with tldextract rather than
+# fetching it over the network on first use.
+_extractor = tldextract.TLDExtract(suffix_list_urls=(), cache_dir=None) if tldextract else None
+
+
+@functools.lru_cache(maxsize=4096)
+def _split_hostname(hostname: str) -> Tuple[str, str, int]:
+    """
+    Splits a hostname into (public suffix, registered domain, subdomain label count).
+    Falls back to plain dot-splitting when tldextract is not installed.
+    """
+    if _extractor is None:
+        labels = hostname.split('.')
+        return labels[-1], hostname, max(len(labels) - 2, 0)
+    ext = _extractor(hostname)
+    registered = f"{ext.domain}.{ext.suffix}" if ext.domain and ext.suffix else hostname
+    subdomains = ext.subdomain.count('.') + 1 if ext.subdomain else 0
+    return ext.suffix, registered, subdomains
+
+
+def _registered_domain(hostname: str) -> str:
+    """Reduces a hostname to its registrable domain (e.g. a.b.example.co.uk -> example.co.uk)."""
+    return _split_hostname(hostname)[1]
+
 
 def extract_urls(body: str) -> List[str]:
     """
@@ -21,144 +163,330 @@ def extract_urls(body: str) -> List[str]:
     if not body:
         return []
 
-    try:
-        # Try to use the faster lxml parser
-        soup = BeautifulSoup(body, 'lxml')
-    except Exception:
-        logger.warning("lxml parser not found. Falling back to 'html.parser'. For better performance, run 'pip install lxml'.")
-        # Fall back to Python's built-in parser
-        soup = BeautifulSoup(body, 'html.parser')
-    
-    # Extract URLs from <a> tags' href attributes
-    urls = {a['href'] for a in soup.find_all('a', href=True)}
+    raw_urls = None
+    if lxml_html is not None:
+        try:
+            # The tree is built in C, unlike a BeautifulSoup walk.
+            tree = lxml_html.fromstring(body)
+        except (lxml_etree.ParserError, ValueError):
+            # Empty or non-HTML body; fall back to scanning the whole string.
+            tree = None
+        if tree is not None:
+            # One walk collects link attributes (anchors, image maps, form targets) and
+            # scans only text nodes for bare URLs, instead of running the regex a second
+            # time over the full markup.
+            raw_urls = []
+            for elem in tree.iter():
+                for attribute in _LINK_ATTRIBUTES:
+                    link = elem.get(attribute)
+                    if link:
+                        raw_urls.append(link)
+                if elem.text:
+                    raw_urls.extend(_URL_RE.findall(elem.text))
+                if elem.tail:
+                    raw_urls.extend(_URL_RE.findall(elem.tail))
 
-    # This pattern is more specific and avoids including trailing characters like '<' or '>'
-    plain_text_urls = set(re.findall(
-        r'\b(?:https?://|www\.)[^\s<>"]+\b', body, re.IGNORECASE
-    ))
+            # libxml2 discards everything after the first </body> or </html>, so markup
+            # appended after the document never reaches the tree; scan that part raw.
+            document_end = _DOCUMENT_END_RE.search(body)
+            if document_end:
+                trailer = body[document_end.start():]
+                raw_urls.extend(html_unescape(''.join(groups)) for groups in _LINK_ATTRIBUTE_RE.findall(trailer))
+                raw_urls.extend(_URL_RE.findall(html_unescape(_LINK_ATTRIBUTE_RE.sub(' ', trailer))))
 
-    # Combine, clean, and unquote the URLs
-    all_urls = {unquote(url.strip('.,)')) for url in urls.union(plain_text_urls)}
+    if raw_urls is None:
+        raw_urls = _URL_RE.findall(body)
+
+    # Combine, clean, and unquote the URLs; dict keys dedupe while keeping order
+    all_urls = list({unquote(url.rstrip(_URL_TRAILING_PUNCTUATION)): None for url in raw_urls})
     
-    logger.info(f"Extracted {len(all_urls)} unique URLs from email body.")
-    return list(all_urls)
+    logger.info("Extracted %d unique URLs from email body.", len(all_urls))
+    return all_urls
+
+
+class _CappedRetry(Retry):
+    """Honours Retry-After, but never sleeps longer than _RETRY_AFTER_CAP seconds."""
+
+    def get_retry_after(self, response):
+        retry_after = super().get_retry_after(response)
+        return None if retry_after is None else min(retry_after, _RETRY_AFTER_CAP)
 
 
-def _resolve_url(url: str, session: requests.Session, max_redirects: int = 5) -> Tuple[Optional[str], List[str]]:
+@contextlib.contextmanager
+def _host_slot(hostname: Optional[str]):
+    """Holds one of the host's concurrent request slots for the duration of the block."""
+    key = hostname or ''
+    with _host_slots_lock:
+        slot = _host_slots.get(key)
+        if slot is None:
+            slot = _host_slots[key] = [threading.Semaphore(_HOST_CONCURRENCY), 0]
+        slot[1] += 1
+    try:
+        with slot[0]:
+            yield
+    finally:
+        with _host_slots_lock:
+            slot[1] -= 1
+            if not slot[1]:
+                del _host_slots[key]
+
+
+def _build_session() -> requests.Session:
+    """
+    Creates a Session whose connection pool is larger than the URL worker count,
+    with a single quick retry on throttling and gateway errors for the HEAD requests.
+    """
+    session = requests.Session()
+    adapter = HTTPAdapter(
+        pool_connections=20,
+        pool_maxsize=20,
+        max_retries=_CappedRetry(
+            total=1,
+            backoff_factor=0.1,
+            status_forcelist=(429, 502, 503, 504),
+            allowed_methods=frozenset(['HEAD']),
+            respect_retry_after_header=True,
+            raise_on_status=False
+        )
+    )
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    session.headers['User-Agent'] = _USER_AGENT
+    # requests would otherwise follow up to 30 hops before our own history check runs.
+    session.max_redirects = _MAX_REDIRECTS
+    return session
+
+
+_thread_local = threading.local()
+
+
+def _get_session() -> requests.Session:
+    """
+    Returns the calling thread's Session, creating it on first use. Each URL worker
+    keeps its own connection pool instead of contending on a shared one; sessions
+    are released with their threads.
+    """
+    session = getattr(_thread_local, 'session', None)
+    if session is None:
+        session = _build_session()
+        _thread_local.session = session
+    return session
+
+
+def _parse_url(url: str) -> Optional[ParseResult]:
+    """urlparse() that logs and returns None for malformed URLs (e.g. an unclosed IPv6 bracket)."""
+    try:
+        return urlparse(url)
+    except ValueError as e:
+        logger.error("Could not parse URL %s: %s", url, e)
+        return None
+
+
+def _resolve_url(url: str, session: requests.Session, max_redirects: int = _MAX_REDIRECTS) -> Tuple[Optional[str], List[str]]:
    
     if url in _url_resolution_cache:
         return _url_resolution_cache[url], []
 
     reasons = []
     try:
-        current_url = url
-        for _ in range(max_redirects):
-            response = session.head(current_url, allow_redirects=False, timeout=3)
-            if 300 <= response.status_code < 400 and 'Location' in response.headers:
-                current_url = response.headers['Location']
-            else:
-                _url_resolution_cache[url] = current_url
-                return current_url, reasons
-        
+        # requests follows the chain itself, reusing pooled connections between hops.
+        with _host_slot(urlparse(url).hostname):
+            response = session.head(url, allow_redirects=True, timeout=3)
+        if len(response.history) >= max_redirects:
+            reasons.append("TOO_MANY_REDIRECTS")
+            return None, reasons
+        if response.status_code == 429 or response.status_code >= 500:
+            # Still throttled or failing after the retry; the URL was not actually resolved.
+            logger.error("Could not resolve URL %s: HTTP %d", url, response.status_code)
+            reasons.append("URL_RESOLUTION_FAILED")
+            return None, reasons
+        _url_resolution_cache[url] = response.url
+        return response.url, reasons
+
+    except requests.TooManyRedirects:
         reasons.append("TOO_MANY_REDIRECTS")
         return None, reasons
-
     except requests.RequestException as e:
-        logger.error(f"Could not resolve URL {url}: {e}")
+        logger.error("Could not resolve URL %s: %s", url, e)
         reasons.append("URL_RESOLUTION_FAILED")
         return None, reasons
 
 
-def _get_domain_age(domain: str) -> Tuple[Optional[int], List[str]]:
+def _load_top_domains(path: str = TOP_DOMAINS_PATH) -> FrozenSet[str]:
+    """
+    Loads the allowlist of well-known registrable domains (one per line, '#' comments).
+    A missing file only disables the WHOIS bypass.
+    """
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            lines = (line.strip().lower() for line in f)
+            return frozenset(line for line in lines if line and not line.startswith('#'))
+    except OSError as e:
+        logger.warning("Top domains allowlist not loaded from %s: %s", path, e)
+        return frozenset()
+
+
+_TOP_DOMAINS = _load_top_domains()
+
+
+def _utcnow() -> datetime:
+    """Current time as a naive UTC datetime (the deprecated datetime.utcnow())."""
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+def _get_domain_age(domain: str, now: Optional[datetime] = None) -> Tuple[Optional[int], List[str]]:
    
-    if domain in _whois_cache:
-        return _whois_cache[domain]
+    domain = _registered_domain(domain)
+    if domain in _TOP_DOMAINS:
+        # Well-known domains are never freshly registered; skip the network round-trip.
+        return TOP_DOMAIN_AGE_DAYS, []
+    if domain in _whois_failures:
+        return _whois_failures[domain]
+    cached = _whois_cache.get(domain)
+    if cached is not None:
+        return cached
 
     reasons = []
     try:
         domain_info = whois.whois(domain)
         if not domain_info.creation_date:
             reasons.append("WHOIS_NO_CREATION_DATE")
+            _whois_cache.set(domain, None, reasons)
             return None, reasons
             
         creation_date = domain_info.creation_date
         if isinstance(creation_date, list):
             creation_date = creation_date[0]
+        # Some registries return aware datetimes; compare everything as naive UTC.
+        if creation_date.tzinfo is not None:
+            creation_date = creation_date.astimezone(timezone.utc).replace(tzinfo=None)
         
-        age = (datetime.now() - creation_date).days
-        _whois_cache[domain] = (age, reasons)
+        age = ((now or _utcnow()) - creation_date).days
+        _whois_cache.set(domain, age, reasons)
         return age, reasons
 
     except Exception as e:
-        logger.error(f"WHOIS lookup failed for {domain}: {e}")
+        logger.error("WHOIS lookup failed for %s: %s", domain, e)
         reasons.append("WHOIS_LOOKUP_FAILED")
-        _whois_cache[domain] = (None, reasons)
+        _whois_failures[domain] = (None, reasons)
         return None, reasons
 
 
-def _analyze_single_url(url: str, session: requests.Session, config: Dict[str, Any]) -> Dict[str, Any]:
-    
-    analysis = {
+def _keyword_matcher(keywords: Tuple[str, ...]) -> Optional[Callable[[str], bool]]:
+    """
+    Returns a case-insensitive "contains any keyword" predicate. Uses an Aho-Corasick
+    automaton (one linear pass for all keywords) when pyahocorasick is installed,
+    otherwise an alternation of the escaped keywords.
+    """
+    if not keywords:
+        return None
+    if ahocorasick is not None:
+        automaton = ahocorasick.Automaton()
+        for keyword in keywords:
+            automaton.add_word(keyword.lower(), keyword)
+        automaton.make_automaton()
+        return lambda text: next(automaton.iter(text.lower()), None) is not None
+    pattern = re.compile('|'.join(map(re.escape, keywords)), re.IGNORECASE)
+    return lambda text: pattern.search(text) is not None
+
+
+@functools.lru_cache(maxsize=4)
+def _url_rules(
+    keywords: Tuple[str, ...],
+    shorteners: Tuple[str, ...],
+    suspicious_tlds: Tuple[str, ...]
+) -> Tuple[Optional[Callable[[str], bool]], Tuple[str, ...], FrozenSet[str]]:
+    """Builds the per-config matchers once; keyed by the config lists as tuples."""
+    return _keyword_matcher(keywords), tuple(s.lower() for s in shorteners), frozenset(suspicious_tlds)
+
+
+def _is_shortened(parsed: ParseResult, shorteners: Tuple[str, ...]) -> bool:
+    """Matches against the case-folded hostname, the same host form URL variants are grouped by."""
+    hostname = parsed.hostname or ''
+    return any(shortener in hostname for shortener in shorteners)
+
+
+class _DomainAgeLookups:
+    """
+    Runs WHOIS lookups on a dedicated pool, keeping one in-flight future per
+    registrable domain so URLs that share a domain share a single lookup.
+    """
+
+    def __init__(self, executor: ThreadPoolExecutor, now: datetime):
+        self._executor = executor
+        self._now = now
+        self._futures: Dict[str, Future] = {}
+        self._lock = threading.Lock()
+
+    def submit(self, hostname: str) -> Future:
+        domain = _registered_domain(hostname)
+        with self._lock:
+            future = self._futures.get(domain)
+            if future is None:
+                future = self._executor.submit(_get_domain_age, domain, self._now)
+                self._futures[domain] = future
+        return future
+
+    def get(self, hostname: str) -> Tuple[Optional[int], List[str]]:
+        return self.submit(hostname).result()
+
+
+def _new_analysis(url: str) -> Dict[str, Any]:
+    return {
         'original_url': url,
         'final_url': url,
         'is_suspicious': False,
         'suspicion_reasons': [],
         'domain_age_days': None
     }
-    
-    url_config = config.get('url_analysis', {})
-    shorteners = set(url_config.get('url_shorteners', []))
-    suspicious_tlds = set(url_config.get('suspicious_tlds', []))
-    keywords = url_config.get('url_keywords', [])
-    keyword_pattern = re.compile('|'.join(keywords), re.IGNORECASE) if keywords else None
 
 
-    parsed_original = urlparse(url)
-    if any(shortener in parsed_original.netloc for shortener in shorteners):
-        analysis['is_suspicious'] = True # Shortened URLs are inherently suspicious
-        analysis['suspicion_reasons'].append("USES_URL_SHORTENER")
-        final_url, reasons = _resolve_url(url, session)
-        analysis['suspicion_reasons'].extend(reasons)
-        if final_url:
-            analysis['final_url'] = final_url
-        else:
-            return analysis
+@functools.lru_cache(maxsize=4096)
+def _host_flags(hostname: str, suspicious_tlds: FrozenSet[str]) -> Tuple[bool, bool, bool]:
+    """
+    Returns (is IP address, suspicious TLD, excessive subdomains) for a hostname; cached
+    so URLs sharing a host are only checked once.
+    """
+    suffix, _, subdomain_count = _split_hostname(hostname)
+    return (
+        bool(_IP_RE.match(hostname)),
+        suffix in suspicious_tlds or suffix.rsplit('.', 1)[-1] in suspicious_tlds,
+        subdomain_count >= 3
+    )
 
-    parsed_final = urlparse(analysis['final_url'])
-    hostname = parsed_final.hostname
 
-    if not hostname:
-        analysis['is_suspicious'] = True
-        analysis['suspicion_reasons'].append("INVALID_URL_NO_HOSTNAME")
-        return analysis
+def _apply_host_analysis(
+    analysis: Dict[str, Any],
+    parsed_final: ParseResult,
+    host_flags: Tuple[bool, bool, bool],
+    domain_age: Tuple[Optional[int], List[str]],
+    keyword_matcher: Optional[Callable[[str], bool]]
+) -> Dict[str, Any]:
+    """Applies every check that depends only on the final URL and its domain age."""
+    is_ip, suspicious_tld, excessive_subdomains = host_flags
 
-    ip_pattern = r'^\d{1,3}\.\d{1,3}\.\d{1,3}\.\d{1,3}$'
-    if re.match(ip_pattern, hostname):
+    if is_ip:
         analysis['is_suspicious'] = True
         analysis['suspicion_reasons'].append("IP_ADDRESS_IN_HOST")
 
-    age, reasons = _get_domain_age(hostname)
+    age, reasons = domain_age
     analysis['suspicion_reasons'].extend(reasons)
     if age is not None:
         analysis['domain_age_days'] = age
         if age < 30:
             analysis['is_suspicious'] = True
             analysis['suspicion_reasons'].append("DOMAIN_AGE_TOO_LOW")
-   
-    try:
-        tld = hostname.split('.')[-1]
-        if tld in suspicious_tlds:
-            analysis['is_suspicious'] = True
-            analysis['suspicion_reasons'].append("SUSPICIOUS_TLD")
-    except IndexError:
-        pass 
 
-    if hostname.count('.') >= 4:
+    if suspicious_tld:
+        analysis['is_suspicious'] = True
+        analysis['suspicion_reasons'].append("SUSPICIOUS_TLD")
+
+    if excessive_subdomains:
         analysis['is_suspicious'] = True
         analysis['suspicion_reasons'].append("EXCESSIVE_SUBDOMAINS")
 
     # Now correctly flags the URL as suspicious if keywords are found.
-    if keyword_pattern and (keyword_pattern.search(parsed_final.path) or keyword_pattern.search(parsed_final.query)):
+    if keyword_matcher and keyword_matcher(f"{parsed_final.path}?{parsed_final.query}"):
         analysis['is_suspicious'] = True
         analysis['suspicion_reasons'].append("SUSPICIOUS_KEYWORDS_IN_URL")
 
@@ -173,20 +501,115 @@ def _analyze_single_url(url: str, session: requests.Session, config: Dict[str, A
     return analysis
 
 
+def _analyze_single_url(
+    url: str,
+    config: Dict[str, Any],
+    domain_ages: Optional[_DomainAgeLookups] = None
+) -> Dict[str, Any]:
+    
+    analysis = _new_analysis(url)
+    
+    url_config = config.get('url_analysis', {})
+    keyword_matcher, shorteners, suspicious_tlds = _url_rules(
+        tuple(url_config.get('url_keywords', [])),
+        tuple(url_config.get('url_shorteners', [])),
+        tuple(url_config.get('suspicious_tlds', []))
+    )
+
+    parsed_original = _parse_url(url)
+    if parsed_original and _is_shortened(parsed_original, shorteners):
+        analysis['is_suspicious'] = True # Shortened URLs are inherently suspicious
+        analysis['suspicion_reasons'].append("USES_URL_SHORTENER")
+        final_url, reasons = _resolve_url(url, _get_session())
+        analysis['suspicion_reasons'].extend(reasons)
+        if final_url:
+            analysis['final_url'] = final_url
+        else:
+            return analysis
+
+    parsed_final = parsed_original if analysis['final_url'] == url else _parse_url(analysis['final_url'])
+    hostname = parsed_final.hostname if parsed_final else None
+
+    if not hostname:
+        analysis['is_suspicious'] = True
+        analysis['suspicion_reasons'].append("INVALID_URL_NO_HOSTNAME")
+        return analysis
+
+    domain_age = domain_ages.get(hostname) if domain_ages else _get_domain_age(hostname)
+    return _apply_host_analysis(
+        analysis, parsed_final, _host_flags(hostname, suspicious_tlds), domain_age, keyword_matcher
+    )
+
+
+def _canonical_url(parsed: ParseResult) -> Tuple[str, Optional[str], Optional[str], str, str]:
+    """
+    Key under which URL variants share one analysis: scheme and host are case-folded and
+    trailing slashes dropped. The query and username stay in the key because the
+    keyword and USERNAME_IN_URL checks read them.
+    """
+    return parsed.scheme.lower(), parsed.hostname, parsed.username, parsed.path.rstrip('/'), parsed.query
+
+
+def _result_for_variant(result: Dict[str, Any], url: str) -> Dict[str, Any]:
+    """Copies an analysis result onto another original URL with the same canonical form."""
+    variant = dict(result, original_url=url, suspicion_reasons=list(result['suspicion_reasons']))
+    if result['final_url'] == result['original_url']:
+        variant['final_url'] = url
+    return variant
+
+
 def analyze_all_urls(urls: List[str], config: Dict[str, Any]) -> List[Dict[str, Any]]:
     
+    url_config = config.get('url_analysis', {})
+    _, shorteners, _ = _url_rules(
+        tuple(url_config.get('url_keywords', [])),
+        tuple(url_config.get('url_shorteners', [])),
+        tuple(url_config.get('suspicious_tlds', []))
+    )
+
+    # Variants that differ only in case or a trailing slash are analysed once.
+    variants: Dict[Tuple, List[str]] = {}
+    representatives: Dict[Tuple, Optional[ParseResult]] = {}
+    url_keys = []
+    for url in urls:
+        parsed = _parse_url(url)
+        # Malformed URLs are keyed on their own text; the worker reports them as invalid.
+        key = _canonical_url(parsed) if parsed else (url,)
+        variants.setdefault(key, []).append(url)
+        representatives.setdefault(key, parsed)
+        url_keys.append(key)
+
+    group_results: Dict[Tuple, Dict[str, Any]] = {}
+    with ThreadPoolExecutor(max_workers=20) as whois_executor, \
+            ThreadPoolExecutor(max_workers=10) as executor:
+        # Phase 1: start WHOIS for every unique domain up front. Shortened URLs
+        # are skipped here; their final host is only known after resolution.
+        domain_ages = _DomainAgeLookups(whois_executor, _utcnow())
+        for parsed in representatives.values():
+            if parsed and parsed.hostname and not _is_shortened(parsed, shorteners):
+                domain_ages.submit(parsed.hostname)
+
+        # Phase 2: per-URL analysis, which only waits on the lookups it needs.
+        future_to_key = {
+            executor.submit(_analyze_single_url, originals[0], config, domain_ages): key
+            for key, originals in variants.items()
+        }
+        for future in as_completed(future_to_key):
+            key = future_to_key[future]
+            try:
+                group_results[key] = future.result()
+            except Exception as exc:
+                logger.error('URL analysis for %s generated an exception: %s', variants[key][0], exc)
+
+    # Results follow the input order, so scoring (which damps repeats in order) is stable.
     results = []
-    with requests.Session() as session:
-        with ThreadPoolExecutor(max_workers=10) as executor:
-            future_to_url = {executor.submit(_analyze_single_url, url, session, config): url for url in urls}
-            for future in as_completed(future_to_url):
-                url = future_to_url[future]
-                try:
-                    result = future.result()
-                    results.append(result)
-                    if result['is_suspicious']:
-                        logger.warning(f"Suspicious URL found: {result['original_url']} -> {result['final_url']}. Reasons: {result['suspicion_reasons']}")
-                except Exception as exc:
-                    logger.error(f'URL analysis for {url} generated an exception: {exc}')
+    for url, key in zip(urls, url_keys):
+        result = group_results.get(key)
+        if result is None:
+            continue
+        variant = result if url == variants[key][0] else _result_for_variant(result, url)
+        results.append(variant)
+        if variant['is_suspicious']:
+            logger.warning("Suspicious URL found: %s -> %s. Reasons: %s", variant['original_url'], variant['final_url'], variant['suspicion_reasons'])
     
-    return results
\ No newline at end of file
+    return results
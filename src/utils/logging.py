@@ -6,11 +6,11 @@ def setup_logger( ):
     logger=logging.getLogger('PhishingDetector')
     logger.setLevel(logging.DEBUG)
     logger.propagate=False
-    handler=logging.StreamHandler(sys.stdout)
-    handler.setLevel(logging.DEBUG)
-    formatter=logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
-    handler.setFormatter(formatter)
     if not logger.handlers:
+        handler=logging.StreamHandler(sys.stdout)
+        handler.setLevel(logging.DEBUG)
+        formatter=logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+        handler.setFormatter(formatter)
         logger.addHandler(handler)
     return logger
 
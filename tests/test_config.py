@@ -0,0 +1,19 @@
+import pytest
+import sys, os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+from src.config import load_config, load_compiled_config
+
+
+def test_compiled_config_cannot_mutate_cached_config(tmp_path):
+    config_file=tmp_path/"config.yaml"
+    config_file.write_text("scoring:\n"
+                           "  weights:\n"
+                           "    headers: {spf_fail: 20}\n"
+                           "thresholds: {high: 80}\n")
+
+    compiled=load_compiled_config(str(config_file))
+    with pytest.raises(TypeError):
+        compiled.score_weights['headers']['spf_fail']=0
+    with pytest.raises(TypeError):
+        compiled.thresholds['high']=0
+    assert load_config(str(config_file))['scoring']['weights']['headers']['spf_fail']==20
@@ -0,0 +1,15 @@
+import pytest
+import sys, os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+import dns.resolver
+from src import headers
+
+
+def test_missing_resolver_config_degrades_to_dns_error(monkeypatch):
+    real_resolver=dns.resolver.Resolver
+    monkeypatch.setattr(dns.resolver, "Resolver", lambda configure=True: real_resolver(filename='/nonexistent/resolv.conf') if configure else real_resolver(configure=False))
+    resolver=headers._build_resolver()
+    assert resolver.nameservers==[]
+
+    monkeypatch.setattr(headers, "_RESOLVER", resolver)
+    assert headers._check_dmarc("example.com")=="dns_error"
@@ -1,22 +1,62 @@
 import pytest 
 import sys, os
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
-from src.ingest import parse_email_file, get_email_body
+from src.ingest import parse_email_file, parse_email_from_string, get_email_body, walk_once, get_email_body_from_parts
 from pathlib import Path 
 
-def test_parse_email_file(tmp_path):
-    dummuy_file=tmp_path/"test_email.eml"
+@pytest.fixture(scope="session")
+def parsed_email(tmp_path_factory):
+    dummuy_file=tmp_path_factory.mktemp("eml")/"test_email.eml"
     dummuy_file.write_text("From:me@gmail.com \n"
                           "To:you@gmail.com \n"  
                           "Subject:test email \n\n"
                           "Test is done")
     
     msg=parse_email_file(str(dummuy_file))
-    body=get_email_body(msg)
+    return msg, get_email_body(msg)
+
+
+def test_parse_email_file(parsed_email):
+    msg, body=parsed_email
     assert msg is not None
-    assert msg["From"]=="me@gmail.com "
-    assert msg["To"]=="you@gmail.com "
+    assert msg["From"]=="me@gmail.com"
+    assert msg["To"]=="you@gmail.com"
     assert msg["Subject"]=="test email "
+
+
+def test_get_email_body(parsed_email):
+    msg, body=parsed_email
     assert "Test is done" in body
 
 
+def test_walk_once_collects_body_and_attachments():
+    msg=parse_email_from_string("MIME-Version: 1.0\n"
+                                "Content-Type: multipart/mixed; boundary=\"b\"\n\n"
+                                "--b\n"
+                                "Content-Type: text/plain\n\n"
+                                "plain body\n"
+                                "--b\n"
+                                "Content-Type: text/html\n\n"
+                                "<p>html body</p>\n"
+                                "--b\n"
+                                "Content-Type: application/octet-stream\n"
+                                "Content-Disposition: attachment; filename=\"file.exe\"\n\n"
+                                "MZ\n"
+                                "--b--")
+
+    parts=walk_once(msg)
+    assert [p.get_filename() for p in parts['attachments']]==["file.exe"]
+    assert "html body" in get_email_body_from_parts(parts)
+    assert get_email_body_from_parts(parts)==get_email_body(msg)
+
+
+def test_read_email_bytes_cache_is_bounded(tmp_path, monkeypatch):
+    from src import ingest
+    monkeypatch.setattr(ingest, "_RAW_CACHE_MAX_BYTES", 10)
+    first, second=tmp_path/"a.eml", tmp_path/"b.eml"
+    first.write_bytes(b"123456")
+    second.write_bytes(b"abcdef")
+    assert ingest.read_email_bytes(str(first))==b"123456"
+    assert ingest.read_email_bytes(str(second))==b"abcdef"
+    assert str(first) not in ingest._RAW_CACHE
+    assert ingest._raw_cache_bytes<=10
@@ -0,0 +1,65 @@
+import pytest 
+import sys, os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+from src.scoring import calculate_risk_score, determine_risk_level
+
+
+def test_determine_risk_level_uses_thresholds():
+    thresholds={'low':30, 'medium':60, 'high':80}
+    assert determine_risk_level(80, thresholds)=="High"
+    assert determine_risk_level(79, thresholds)=="Medium"
+    assert determine_risk_level(30, thresholds)=="Low"
+    assert determine_risk_level(29, thresholds)=="Very Low"
+
+
+WEIGHTS={
+    "headers": {"spf_fail": 20, "dkim_fail": 20, "dmarc_fail": 25, "from_return_path_mismatch": 15},
+    "urls": {"suspicious_domain": 30, "shortened_url": 25, "ip_address_url": 25},
+    "attachments": {"dangerous_file_type": 40, "zip_with_executable": 50}
+}
+
+
+def test_calculate_risk_score_breakdown():
+    headers={'spf_result': 'fail', 'dkim_result': 'pass', 'from_return_path_mismatch': True}
+    urls=[{'original_url': 'http://bit.ly/x', 'is_suspicious': True, 'suspicion_reasons': ['USES_URL_SHORTENER']}]
+
+    result=calculate_risk_score(headers, urls, [], WEIGHTS)
+    assert result['total_score']==90
+    assert result['breakdown']==[
+        {'reason': 'SPF Check Failed', 'score': 20},
+        {'reason': 'From/Return-Path Mismatch', 'score': 15},
+        {'reason': 'Suspicious URL (http://bit.ly/x)', 'score': 30},
+        {'reason': 'URL is Shortened (http://bit.ly/x)', 'score': 25},
+    ]
+
+
+def test_calculate_risk_score_skips_zero_weights():
+    weights={"headers": {"spf_fail": 0}}
+    result=calculate_risk_score({'spf_result': 'fail'}, [], [], weights)
+    assert result=={'total_score': 0, 'breakdown': []}
+
+
+def test_calculate_risk_score_damps_repeated_families():
+    urls=[{'original_url': f'http://evil{i}.example', 'is_suspicious': True, 'suspicion_reasons': []} for i in range(4)]
+
+    result=calculate_risk_score({}, urls, [], WEIGHTS)
+    assert [item['score'] for item in result['breakdown']]==[30, 7.5, 7.5]
+    assert result['total_score']==45
+
+
+def test_calculate_risk_score_stops_at_cap():
+    headers={'spf_result': 'fail', 'dkim_result': 'fail', 'dmarc_result': 'fail', 'from_return_path_mismatch': True}
+    attachments=[{'filename': 'a.zip', 'is_dangerous': True, 'contains_executable_in_zip': True}]
+
+    result=calculate_risk_score(headers, [], attachments, WEIGHTS)
+    assert result['total_score']==100
+    assert result['breakdown'][-1]=={'reason': 'Dangerous Attachment Type (a.zip)', 'score': 40}
+
+
+def test_calculate_risk_score_rounds_halves_up():
+    weights={"headers": {}, "urls": {"suspicious_domain": 10}, "attachments": {}}
+    urls=[{'original_url': f'http://evil{i}.example', 'is_suspicious': True, 'suspicion_reasons': []} for i in range(2)]
+
+    result=calculate_risk_score({}, urls, [], weights)
+    assert [item['score'] for item in result['breakdown']]==[10, 2.5]
+    assert result['total_score']==13
@@ -0,0 +1,128 @@
+import pytest
+import sys, os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+from src import urls
+from src.urls import analyze_all_urls, extract_urls, _get_domain_age
+
+
+CONFIG={
+    'url_analysis':{
+        'url_keywords':['login', 'verify'],
+        'url_shorteners':[],
+        'suspicious_tlds':['xyz'],
+    }
+}
+
+URLS=[
+    "http://192.168.1.10/login",
+    "https://a.b.c.evil.xyz/verify?user=1",
+    "https://www.example.com/",
+    "https://user@example.com/account",
+    "http:///nohost",
+]
+
+
+@pytest.fixture(autouse=True)
+def fake_whois(monkeypatch):
+    monkeypatch.setattr(urls, "_get_domain_age", lambda domain, now=None: (10, []) if domain.endswith(".xyz") else (4000, []))
+
+
+def test_analyze_all_urls_flags_host_features():
+    results={r['original_url']: r for r in analyze_all_urls(URLS, CONFIG)}
+    assert results["http://192.168.1.10/login"]['suspicion_reasons']==["IP_ADDRESS_IN_HOST", "SUSPICIOUS_KEYWORDS_IN_URL", "NOT_USING_HTTPS"]
+    assert results["https://a.b.c.evil.xyz/verify?user=1"]['suspicion_reasons']==["DOMAIN_AGE_TOO_LOW", "SUSPICIOUS_TLD", "EXCESSIVE_SUBDOMAINS", "SUSPICIOUS_KEYWORDS_IN_URL"]
+    assert results["https://www.example.com/"]['is_suspicious'] is False
+    assert results["https://user@example.com/account"]['suspicion_reasons']==["USERNAME_IN_URL"]
+    assert results["http:///nohost"]['suspicion_reasons']==["INVALID_URL_NO_HOSTNAME"]
+
+
+def test_extract_urls_reads_hrefs_and_text_nodes():
+    body="<p>Go to http://text.com/page.</p><a href='http://href.com/x'>click</a><!-- www.comment.org -->"
+    assert extract_urls(body)==["http://text.com/page", "http://href.com/x", "www.comment.org"]
+    assert extract_urls("plain http://a.com/b%20c, then www.d.org")==["http://a.com/b c", "www.d.org"]
+
+
+def test_top_domains_skip_whois(monkeypatch):
+    def no_network(domain):
+        raise AssertionError("WHOIS should not be queried for " + domain)
+    monkeypatch.setattr(urls.whois, "whois", no_network)
+    assert _get_domain_age("login.microsoft.com")==(urls.TOP_DOMAIN_AGE_DAYS, [])
+
+
+def test_url_variants_are_analysed_once(monkeypatch):
+    calls=[]
+    analyze=urls._analyze_single_url
+    monkeypatch.setattr(urls, "_analyze_single_url", lambda url, *args: calls.append(url) or analyze(url, *args))
+    batch=["https://example.com/login", "https://example.com/login/", "https://EXAMPLE.com/login", "https://example.com/login?next=1"]
+    results={r['original_url']: r for r in analyze_all_urls(batch, CONFIG)}
+    assert len(calls)==2
+    assert set(results)==set(batch)
+    assert results["https://EXAMPLE.com/login"]['final_url']=="https://EXAMPLE.com/login"
+    assert results["https://example.com/login/"]['suspicion_reasons']==results["https://example.com/login"]['suspicion_reasons']
+
+
+def test_malformed_url_is_reported_not_raised():
+    result=urls._analyze_single_url("http://[evil/login", CONFIG)
+    assert result['is_suspicious'] is True
+    assert result['suspicion_reasons']==["INVALID_URL_NO_HOSTNAME"]
+
+
+def test_malformed_url_does_not_abort_batch():
+    results={r['original_url']: r for r in analyze_all_urls(["http://[evil/login", "https://www.example.com/"], CONFIG)}
+    assert results["http://[evil/login"]['suspicion_reasons']==["INVALID_URL_NO_HOSTNAME"]
+    assert results["https://www.example.com/"]['is_suspicious'] is False
+
+
+def test_extract_urls_reads_form_and_image_map_links():
+    body=("<form action='https://evil.xyz/pay'><button formaction='https://evil.xyz/alt'>Pay</button></form>"
+          "<map><area href='http://evil.xyz/login'></map>")
+    assert extract_urls(body)==["https://evil.xyz/pay", "https://evil.xyz/alt", "http://evil.xyz/login"]
+
+
+class _FakeResponse:
+    def __init__(self, url, status_code):
+        self.url=url
+        self.status_code=status_code
+        self.history=[]
+
+
+class _FakeSession:
+    def __init__(self, status_code):
+        self.status_code=status_code
+
+    def head(self, url, **kwargs):
+        return _FakeResponse(url, self.status_code)
+
+
+@pytest.mark.parametrize("status_code", [429, 503])
+def test_throttled_resolution_fails_and_is_not_cached(status_code):
+    url="https://bit.ly/throttled%d" % status_code
+    assert urls._resolve_url(url, _FakeSession(status_code))==(None, ["URL_RESOLUTION_FAILED"])
+    assert url not in urls._url_resolution_cache
+    assert urls._host_slots=={}
+
+
+def test_session_caps_redirect_chain():
+    assert urls._build_session().max_redirects==urls._MAX_REDIRECTS
+
+
+def test_extract_urls_reads_links_after_document_end():
+    body=("<html><body><p>Your account is locked.</p></body></html>\n"
+          "<a href='http://evil-login.xyz/verify?a=1&amp;b=2'>Unlock</a> http://evil2.xyz/pay")
+    assert extract_urls(body)==["http://evil-login.xyz/verify?a=1&b=2", "http://evil2.xyz/pay"]
+    assert extract_urls("<p>hi</p></body><form action=https://evil.xyz/pay></form>")==["https://evil.xyz/pay"]
+
+
+@pytest.mark.parametrize("batch", [["https://BIT.LY/abc", "https://bit.ly/abc"], ["https://bit.ly/abc", "https://BIT.LY/abc"]])
+def test_shortener_variants_flagged_regardless_of_order(monkeypatch, batch):
+    monkeypatch.setattr(urls, "_resolve_url", lambda url, session, max_redirects=5: ("https://landing.xyz/login", []))
+    config={'url_analysis':dict(CONFIG['url_analysis'], url_shorteners=['bit.ly'])}
+    results={r['original_url']: r for r in analyze_all_urls(batch, config)}
+    for url in batch:
+        assert results[url]['suspicion_reasons'][0]=="USES_URL_SHORTENER"
+        assert results[url]['final_url']=="https://landing.xyz/login"
+
+
+def test_results_follow_input_order():
+    batch=["https://www.example.com/", "https://a.b.c.evil.xyz/verify?user=1", "https://EXAMPLE.com/login", "http://[evil/login", "https://example.com/login/"]
+    assert [r['original_url'] for r in analyze_all_urls(batch, CONFIG)]==batch